@@ -1,20 +1,43 @@
 #!/usr/bin/env python3
 import argparse
+import importlib.metadata
+import importlib.util
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+def hf_transfer_supported():
+    """huggingface_hub 1.0+ ignores HF_HUB_ENABLE_HF_TRANSFER (and warns), so only older releases opt in."""
+    try:
+        version = importlib.metadata.version("huggingface_hub")
+    except importlib.metadata.PackageNotFoundError:
+        return False
+    major = version.split(".", 1)[0]
+    return major.isdigit() and int(major) < 1
+
 def main():
-    ap = argparse.ArgumentParser(description="Download a subset of a HF repo via snapshot_download (no hf CLI needed).")
+    ap = argparse.ArgumentParser(description="Download a subset of a HF repo via huggingface_hub (no hf CLI needed).")
     ap.add_argument("--repo", required=True, help="Repo id, e.g. ales27pm/Dolphin3.0-CoreML")
     ap.add_argument("--local-dir", required=True, help="Destination directory for HF snapshot")
     ap.add_argument("--allow-pattern", action="append", default=[], help="Repeatable allow_patterns glob(s)")
     ap.add_argument("--revision", default=None, help="Optional revision/commit/tag")
     ap.add_argument("--token-env", default="HF_TOKEN", help="Env var holding HF token (optional)")
+    ap.add_argument("--max-workers", type=int, default=32, help="Concurrent file downloads (default: 32)")
     args = ap.parse_args()
 
+    # The flag is read when huggingface_hub is imported, so decide before importing it.
+    # Enabling it without the package installed makes huggingface_hub error out.
+    if hf_transfer_supported():
+        if importlib.util.find_spec("hf_transfer") is not None:
+            os.environ.setdefault("HF_HUB_ENABLE_HF_TRANSFER", "1")
+        else:
+            print("[i] hf_transfer not installed; using the default downloader. For faster large downloads:", file=sys.stderr)
+            print("   python3 -m pip install --upgrade hf_transfer", file=sys.stderr)
+
     try:
-        from huggingface_hub import snapshot_download
+        from huggingface_hub import HfApi, hf_hub_download
+        from huggingface_hub.utils import filter_repo_objects
     except Exception as e:
         print("❌ Missing huggingface_hub. Install with:", file=sys.stderr)
         print("   python3 -m pip install --upgrade huggingface_hub", file=sys.stderr)
@@ -26,7 +49,7 @@ def main():
     local_dir.mkdir(parents=True, exist_ok=True)
 
     allow_patterns = args.allow_pattern or None
-    print(f"[i] snapshot_download repo={args.repo}")
+    print(f"[i] download repo={args.repo}")
     if args.revision:
         print(f"[i] revision={args.revision}")
     if allow_patterns:
@@ -35,15 +58,31 @@ def main():
     if not token:
         print("[!] No HF token detected (HF_TOKEN). You may get rate-limited on large downloads.", file=sys.stderr)
 
-    snapshot_path = snapshot_download(
-        repo_id=args.repo,
-        local_dir=str(local_dir),
-        allow_patterns=allow_patterns,
-        revision=args.revision,
-        token=token,
+    # Pin the revision to a commit so every file comes from the same snapshot.
+    repo_info = HfApi().repo_info(args.repo, revision=args.revision, token=token)
+    files = list(
+        filter_repo_objects(
+            (s.rfilename for s in repo_info.siblings or []),
+            allow_patterns=allow_patterns,
+        )
     )
+    if not files:
+        print("[!] No files in the repo matched the allow patterns.", file=sys.stderr)
+    print(f"[i] downloading {len(files)} file(s) at {repo_info.sha} with {args.max_workers} workers")
+
+    def download(filename):
+        return hf_hub_download(
+            repo_id=args.repo,
+            filename=filename,
+            revision=repo_info.sha,
+            local_dir=str(local_dir),
+            token=token,
+        )
+
+    with ThreadPoolExecutor(max_workers=max(1, args.max_workers)) as pool:
+        list(pool.map(download, files))
 
-    print(f"[✓] Done. Snapshot at: {snapshot_path}")
+    print(f"[✓] Done. Snapshot at: {local_dir}")
 
 if __name__ == "__main__":
     main()
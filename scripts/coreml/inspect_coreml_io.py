@@ -1,9 +1,105 @@
 #!/usr/bin/env python3
 import argparse
 import json
+import os
+import stat
 import sys
 from pathlib import Path
 
+MLPACKAGE_DEFAULT_SPEC = Path("Data/com.apple.CoreML/model.mlmodel")
+
+
+def _read_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _split_top_level_fields(raw):
+    """Yield (field_number, start, end) for each top-level protobuf field without decoding payloads."""
+    pos = 0
+    size = len(raw)
+    while pos < size:
+        start = pos
+        key, pos = _read_varint(raw, pos)
+        field_number, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            _, pos = _read_varint(raw, pos)
+        elif wire_type == 1:
+            pos += 8
+        elif wire_type == 2:
+            length, pos = _read_varint(raw, pos)
+            pos += length
+        elif wire_type == 5:
+            pos += 4
+        else:
+            raise ValueError(f"unsupported protobuf wire type {wire_type}")
+        if pos > size:
+            raise ValueError("truncated protobuf message")
+        yield field_number, start, pos
+
+
+def _spec_file_for(p, is_dir):
+    if not is_dir:
+        return p
+    manifest_path = p / "Manifest.json"
+    if manifest_path.is_file():
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        root_id = manifest.get("rootModelIdentifier")
+        item = manifest.get("itemInfoEntries", {}).get(root_id, {})
+        if item.get("path"):
+            return p / "Data" / item["path"]
+    return p / MLPACKAGE_DEFAULT_SPEC
+
+
+def _load_description_spec(p, is_dir):
+    """Parse the Model proto while skipping the model body (mlProgram, neuralNetwork, ...).
+
+    The body holds the op graph and can be tens of MB; only the description and the
+    name of the model type are needed here, so the body payload is dropped before
+    parsing and its oneof is marked as set with an empty message.
+    """
+    from coremltools.proto import Model_pb2
+
+    raw = memoryview(_spec_file_for(p, is_dir).read_bytes())
+    type_fields = {f.number: f.name for f in Model_pb2.Model.DESCRIPTOR.oneofs_by_name["Type"].fields}
+
+    kept = []
+    model_type = None
+    for field_number, start, end in _split_top_level_fields(raw):
+        if field_number in type_fields:
+            model_type = type_fields[field_number]
+        else:
+            kept.append(raw[start:end])
+
+    spec = Model_pb2.Model()
+    spec.ParseFromString(b"".join(kept))
+    if model_type is not None:
+        getattr(spec, model_type).SetInParent()
+    return spec
+
+
+def _dump_feature(feature):
+    """Flatten a FeatureDescription dict (from MessageToDict) into the report entry."""
+    entry = {"name": feature.get("name", "")}
+    # FeatureType holds the Type oneof plus the plain isOptional flag.
+    t, type_fields = next(
+        ((k, v) for k, v in feature.get("type", {}).items() if k != "isOptional"),
+        (None, {}),
+    )
+    entry["type"] = t
+    if t == "multiArrayType":
+        # MessageToDict renders int64 values as strings.
+        entry["shape"] = list(map(int, type_fields.get("shape", ())))
+        entry["dataType"] = type_fields.get("dataType", "INVALID_ARRAY_DATA_TYPE")
+    return entry
+
 
 def main():
     ap = argparse.ArgumentParser(description="Inspect CoreML model inputs/outputs (mlpackage).")
@@ -14,8 +110,10 @@ def main():
     ap.add_argument("--strict", action="store_true", help="Exit non-zero when any expectation is missing")
     args = ap.parse_args()
 
-    p = Path(args.model_path).expanduser().resolve()
-    if not p.exists():
+    p = Path(os.path.abspath(os.path.expanduser(args.model_path)))
+    try:
+        is_dir = stat.S_ISDIR(os.stat(p).st_mode)
+    except (FileNotFoundError, NotADirectoryError):
         print(f"❌ Not found: {p}", file=sys.stderr)
         sys.exit(1)
 
@@ -28,28 +126,35 @@ def main():
         sys.exit(1)
 
     try:
-        mlmodel = ct.models.MLModel(str(p))
-        spec = mlmodel.get_spec()
-    except Exception as e:
-        print(f"❌ Failed to load model: {e}", file=sys.stderr)
-        sys.exit(1)
+        spec = _load_description_spec(p, is_dir)
+    except Exception:
+        # Fall back to a full proto parse for layouts the fast path does not handle.
+        # load_spec only reads the model proto; MLModel() would also compile and load weights.
+        try:
+            spec = ct.utils.load_spec(str(p))
+        except Exception as e:
+            print(f"❌ Failed to load model: {e}", file=sys.stderr)
+            sys.exit(1)
 
-    desc = spec.description
-    input_names = [i.name for i in desc.input]
-    output_names = [o.name for o in desc.output]
+    from google.protobuf.json_format import MessageToDict
 
-    state_names = []
-    if hasattr(desc, "state"):
-        state_names = [s.name for s in desc.state]
+    desc = MessageToDict(spec.description, preserving_proto_field_name=True)
+    inputs = [_dump_feature(f) for f in desc.get("input", [])]
+    outputs = [_dump_feature(f) for f in desc.get("output", [])]
+    states = [_dump_feature(f) for f in desc.get("state", [])]
+    input_names = [f["name"] for f in inputs]
+    output_names = [f["name"] for f in outputs]
+    state_names = [f["name"] for f in states]
+    metadata = desc.get("metadata", {})
 
     out = {
-        "model_type": "mlProgram" if spec.WhichOneof("Type") == "mlProgram" else spec.WhichOneof("Type"),
-        "inputs": [],
-        "outputs": [],
-        "states": [],
+        "model_type": spec.WhichOneof("Type"),
+        "inputs": inputs,
+        "outputs": outputs,
+        "states": states,
         "metadata": {
-            "shortDescription": getattr(desc, "shortDescription", ""),
-            "versionString": getattr(desc, "versionString", ""),
+            "shortDescription": metadata.get("shortDescription", ""),
+            "versionString": metadata.get("versionString", ""),
         },
         "names": {
             "inputs": input_names,
@@ -63,37 +168,6 @@ def main():
         },
     }
 
-    for inp in desc.input:
-        entry = {"name": inp.name}
-        t = inp.type.WhichOneof("Type")
-        entry["type"] = t
-        if t == "multiArrayType":
-            mat = inp.type.multiArrayType
-            entry["shape"] = list(mat.shape) if len(mat.shape) else []
-            entry["dataType"] = str(mat.dataType)
-        out["inputs"].append(entry)
-
-    for o in desc.output:
-        entry = {"name": o.name}
-        t = o.type.WhichOneof("Type")
-        entry["type"] = t
-        if t == "multiArrayType":
-            mat = o.type.multiArrayType
-            entry["shape"] = list(mat.shape) if len(mat.shape) else []
-            entry["dataType"] = str(mat.dataType)
-        out["outputs"].append(entry)
-
-    if hasattr(desc, "state"):
-        for st in desc.state:
-            entry = {"name": st.name}
-            t = st.type.WhichOneof("Type")
-            entry["type"] = t
-            if t == "multiArrayType":
-                mat = st.type.multiArrayType
-                entry["shape"] = list(mat.shape) if len(mat.shape) else []
-                entry["dataType"] = str(mat.dataType)
-            out["states"].append(entry)
-
     print(json.dumps(out, indent=2))
 
     if args.strict: